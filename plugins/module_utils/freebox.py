@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2024, Your Name <your.email@example.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""
+Helpers shared by the Freebox modules: the persistent event loop, the cached
+Freebox API sessions and the on-disk cache of the Freebox state.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import asyncio
+import atexit
+import importlib.util
+import json
+import os
+import re
+import time
+import uuid
+
+# Event loop shared by every run_module() call, the cached sessions are bound to it
+_LOOP = None
+
+# Authenticated Freebox API clients, keyed by freebox_url
+_FB_CACHE = {}
+
+# Number of seconds the on-disk cache of the Freebox state is reused for
+CACHE_TTL = 60
+
+
+def _cache_path(key, suffix='.json'):
+    """
+    Returns the path of an on-disk cache file for the given key.
+
+    The '.json' file holds the cached value, the '.gen' file a marker changed on every invalidation.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'freebox_ansible', re.sub(r'[^\w.-]', '_', key) + suffix)
+
+
+def _read_generation(gen_path):
+    """
+    Returns the current invalidation marker, or None if the key was never invalidated.
+    """
+    try:
+        with open(gen_path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _read_cache(path, ttl):
+    """
+    Reads a cache file younger than ttl seconds.
+
+    Returns:
+        tuple: (True, value) on a cache hit, (False, None) otherwise.
+    """
+    try:
+        if time.time() - os.path.getmtime(path) < ttl:
+            with open(path) as f:
+                return True, json.load(f)
+    except (OSError, ValueError):
+        pass
+    return False, None
+
+
+def _write_cache(path, gen_path, generation, value):
+    """
+    Atomically writes a cache file, ignoring any error.
+
+    Nothing is kept if the key was invalidated since generation was read, as the
+    value may have been fetched before another run changed the Freebox.
+    """
+    if _read_generation(gen_path) != generation:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+        if _read_generation(gen_path) != generation:
+            # Invalidated while writing
+            os.remove(path)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+async def cached(key, ttl, fetch):
+    """
+    Returns the value cached on disk for the given key, fetching and storing it when missing or expired.
+
+    The cache is best effort: any error reading or writing it falls back to fetching.
+
+    Args:
+        key (str): The cache key, including the freebox_url it applies to.
+        ttl (int): The number of seconds a cached value is reused for.
+        fetch (callable): Coroutine function returning the fresh value.
+
+    Returns:
+        The cached or freshly fetched value.
+    """
+    path = _cache_path(key)
+    gen_path = _cache_path(key, '.gen')
+    found, value = _read_cache(path, ttl)
+    if found:
+        return value
+
+    generation = _read_generation(gen_path)
+    value = await fetch()
+    _write_cache(path, gen_path, generation, value)
+    return value
+
+
+def invalidate_cache(key):
+    """
+    Removes the on-disk cache file for the given key.
+
+    The invalidation marker is changed first, so runs that fetched the value
+    before this call do not write it back.
+    """
+    path = _cache_path(key)
+    gen_path = _cache_path(key, '.gen')
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp_path = f"{gen_path}.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, gen_path)
+    except OSError:
+        pass
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def has_freebox_api():
+    """
+    Returns whether freebox_api is installed, without importing it.
+    """
+    return importlib.util.find_spec('freebox_api') is not None
+
+
+async def get_fb(freebox_url):
+    """
+    Returns an authenticated Freebox API client, opening the session only on first use.
+
+    Args:
+        freebox_url (str): The URL of the Freebox device.
+
+    Returns:
+        Freepybox: The cached client for this Freebox.
+    """
+    fb = _FB_CACHE.get(freebox_url)
+    if fb is None:
+        # Imported on first use, freebox_api pulls in aiohttp which is slow to load
+        from freebox_api import Freepybox
+        fb = Freepybox()
+        await fb.open(freebox_url, 443)
+        _FB_CACHE[freebox_url] = fb
+    return fb
+
+
+async def close_fb():
+    """
+    Closes every cached Freebox API session.
+    """
+    while _FB_CACHE:
+        _, fb = _FB_CACHE.popitem()
+        try:
+            await fb.close()
+        except Exception:
+            # The module result has already been reported, don't fail on logout
+            pass
+
+
+def get_loop():
+    """
+    Returns the persistent event loop, creating it on first use.
+
+    The loop is kept alive across module runs so the sessions cached in
+    _FB_CACHE stay usable, and is closed along with them at interpreter exit.
+    uvloop is used when it is installed.
+    """
+    global _LOOP
+    if _LOOP is None or _LOOP.is_closed():
+        try:
+            import uvloop
+            _LOOP = uvloop.new_event_loop()
+        except ImportError:
+            _LOOP = asyncio.new_event_loop()
+        asyncio.set_event_loop(_LOOP)
+        atexit.register(_shutdown_loop, _LOOP)
+    return _LOOP
+
+
+def _shutdown_loop(loop):
+    """
+    Closes the cached Freebox sessions and then the event loop they are bound to.
+    """
+    if loop.is_closed():
+        return
+    try:
+        loop.run_until_complete(close_fb())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+    finally:
+        loop.close()
@@ -6,10 +6,18 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
-import json
-from ansible.module_utils.basic import AnsibleModule
-from freebox_api import Freepybox
+from ansible.module_utils.basic import AnsibleModule, missing_required_lib
+from ansible_collections.lpi_code.freebox.plugins.module_utils.freebox import (
+    CACHE_TTL,
+    cached,
+    get_fb,
+    get_loop,
+    has_freebox_api,
+    invalidate_cache,
+)
 import asyncio
+import ipaddress
+import re
 
 DOCUMENTATION = r'''
 ---
@@ -22,6 +30,8 @@ version_added: "1.0.0"
 description: |
     This module configures a static DHCP binding on a Freebox router.
     It requires the Freebox API to be accessible and valid credentials for authentication.
+    The existing leases are cached for 60 seconds under $XDG_CACHE_HOME/freebox_ansible
+    (~/.cache/freebox_ansible by default) and the cache is dropped whenever a lease is created.
 
 options:
     freebox_url:
@@ -31,15 +41,39 @@ options:
         default: 'mafreebox.freebox.fr'
 
     mac:
-        description: The MAC address of the device to be configured for static DHCP.
-        required: true
+        description: |
+            The MAC address of the device to be configured for static DHCP.
+            Bytes may be separated by ':', '-' or nothing, it is sent as 'AA:BB:CC:DD:EE:FF'.
+            Required together with ip, mutually exclusive with leases.
+        required: false
         type: str
 
     ip:
-        description: The static IP address (either IPv4 or IPv6) to assign to the device.
-        required: true
+        description: |
+            The static IP address (either IPv4 or IPv6) to assign to the device.
+            Required together with mac, mutually exclusive with leases.
+        required: false
         type: str
 
+    leases:
+        description: |
+            A list of static DHCP bindings to configure in a single Freebox session.
+            Existing leases are fetched once and the missing ones are created concurrently.
+            Duplicate entries are configured once, entries giving one MAC different IPs fail.
+            Mutually exclusive with mac and ip.
+        required: false
+        type: list
+        elements: dict
+        suboptions:
+            mac:
+                description: The MAC address of the device.
+                required: true
+                type: str
+            ip:
+                description: The static IP address (either IPv4 or IPv6) to assign to the device.
+                required: true
+                type: str
+
 author:
     - Your Name (@yourGitHubHandle)
 '''
@@ -58,6 +92,15 @@ EXAMPLES = r'''
     freebox_url: "mafreebox.freebox.fr"
     mac: "00:11:22:33:44:55"
     ip: "2001:db8::1"
+
+# Configure several static DHCP leases at once
+- name: Set static DHCP leases on Freebox
+  freebox_static_dhcp:
+    leases:
+      - mac: "00:11:22:33:44:55"
+        ip: "192.168.1.100"
+      - mac: "00:11:22:33:44:66"
+        ip: "192.168.1.101"
 '''
 
 RETURN = r'''
@@ -84,62 +127,204 @@ ip_address:
     type: str
     returned: always
     sample: '192.168.1.100'
+
+leases:
+    description: The outcome of each lease when leases is used.
+    type: list
+    elements: dict
+    returned: when leases is used
+    sample: [{"mac": "00:11:22:33:44:55", "ip": "192.168.1.100", "changed": true, "failed": false, "message": "Static DHCP configured for MAC 00:11:22:33:44:55 with IP 192.168.1.100"}]
 '''
 
-async def configure_static_dhcp(freebox_url, mac, ip, session_token):
+# MAC address with optional ':' or '-' separators, one group per byte
+_MAC_RE = re.compile(
+    r'^([0-9A-Fa-f]{2})[:\-]?([0-9A-Fa-f]{2})[:\-]?([0-9A-Fa-f]{2})'
+    r'[:\-]?([0-9A-Fa-f]{2})[:\-]?([0-9A-Fa-f]{2})[:\-]?([0-9A-Fa-f]{2})$'
+)
+
+
+def _norm_mac(mac):
     """
-    Configures the static DHCP mapping for the given MAC address and IP.
+    Returns the MAC address in canonical 'AA:BB:CC:DD:EE:FF' form, or None if it is malformed.
+    """
+    match = _MAC_RE.match(mac)
+    return ':'.join(group.upper() for group in match.groups()) if match else None
+
+
+async def _get_static_leases(fb, freebox_url):
+    """
+    Returns the static DHCP leases configured on the Freebox, reusing the on-disk cache when it is fresh.
 
     Args:
+        fb (Freepybox): The authenticated Freebox API client.
         freebox_url (str): The URL of the Freebox device.
+
+    Returns:
+        dict: The static leases, keyed by normalized MAC address.
+    """
+    static_confs = await cached(f"leases-{freebox_url}", CACHE_TTL, fb.dhcp.get_dhcp_static_leases)
+    return {_norm_mac(conf['mac']) or conf['mac'].upper(): conf for conf in static_confs}
+
+
+async def _create_static_lease(fb, mac, ip):
+    """
+    Creates a single static DHCP lease.
+
+    Args:
+        fb (Freepybox): The authenticated Freebox API client.
         mac (str): The MAC address to configure.
         ip (str): The static IP address to assign.
+
+    Raises:
+        Exception: If the Freebox API rejects the lease.
+    """
+    result = await fb.dhcp.create_dhcp_static_lease(
+        {
+            "ip" : ip,
+            "mac" : mac
+        }
+    )
+
+    if not result.get("mac"):
+        raise Exception(f"Failed to configure static DHCP: {result['msg']}")
+
+
+async def configure_static_dhcp_leases(freebox_url, leases, session_token, check_mode=False):
+    """
+    Configures several static DHCP mappings using a single Freebox session.
+
+    The existing leases are fetched once and the missing ones are created concurrently.
+
+    Args:
+        freebox_url (str): The URL of the Freebox device.
+        leases (list): The leases to configure, as dicts with 'mac' and 'ip' keys.
         session_token (str): The authentication token for the Freebox API.
+        check_mode (bool): Only report the leases that would be created.
 
     Returns:
-        bool: True if the static DHCP configuration is successful. False if nothing changed
+        list: One dict per distinct lease with 'mac', 'ip', 'changed', 'failed' and 'message' keys.
 
     Raises:
-        Exception: If the configuration fails.
+        Exception: If a lease is malformed or the existing leases cannot be retrieved.
     """
+    # Validate and normalize the input before any request to the Freebox
+    normalized = []
+    for lease in leases:
+        mac = _norm_mac(lease['mac'])
+        if mac is None:
+            raise Exception(f"Invalid MAC address: {lease['mac']}")
+        try:
+            ip = str(ipaddress.ip_address(lease['ip']))
+        except ValueError:
+            raise Exception(f"Invalid IP address: {lease['ip']}")
+        normalized.append(dict(mac=mac, ip=ip))
+
     try:
         # Connect to the Freebox API
-        fb = Freepybox()
-        await fb.open(freebox_url, 443)
-        # check if does not already exist
-        static_confs = await fb.dhcp.get_dhcp_static_leases()
-        i = 0
-        while i < len(static_confs) and static_confs[i]['mac'].upper() != mac.upper():
-            i+= 1
-        found_mac = i < len(static_confs) and static_confs[i]['mac'].upper() == mac.upper()
-        if found_mac:
-            # TODO use a put request to update data
-            return False
-        
-
-        # Make the request to configure static DHCP
-        result = await fb.dhcp.create_dhcp_static_lease(
-            {
-                "ip" : ip,
-                "mac" : mac
-            }
-        )
-        
-        if result.get("mac"):
-            return True
-        else:
-            raise Exception(f"Failed to configure static DHCP: {result['msg']}")
-    
+        fb = await get_fb(freebox_url)
+        # check which leases do not already exist
+        lease_by_mac = await _get_static_leases(fb, freebox_url)
     except Exception as e:
         raise Exception(f"Error configuring static DHCP: {str(e)}")
 
+    # Identical entries, e.g. produced by templating, are configured once
+    ips_by_mac = {}
+    for lease in normalized:
+        ips = ips_by_mac.setdefault(lease['mac'], [])
+        if lease['ip'] not in ips:
+            ips.append(lease['ip'])
+
+    results = []
+    pending = []
+    for mac, ips in ips_by_mac.items():
+        for ip in ips:
+            item = dict(mac=mac, ip=ip, changed=False, failed=False, message='')
+            if len(ips) > 1:
+                # Only one lease can exist per MAC, don't let the request order decide
+                item['failed'] = True
+                item['message'] = f"Conflicting IP addresses given for MAC {mac}: {', '.join(ips)}"
+            elif mac in lease_by_mac:
+                # TODO use a put request to update data
+                item['message'] = f"Static DHCP lease already exists for MAC {mac}"
+            else:
+                pending.append(item)
+            results.append(item)
+
+    if check_mode:
+        for item in pending:
+            item['changed'] = True
+            item['message'] = f"Static DHCP would be configured for MAC {item['mac']} with IP {item['ip']}"
+        return results
+
+    # Make the requests to configure static DHCP
+    outcomes = await asyncio.gather(
+        *[_create_static_lease(fb, item['mac'], item['ip']) for item in pending],
+        return_exceptions=True
+    )
+    if pending:
+        # The cached leases no longer reflect the Freebox
+        invalidate_cache(f"leases-{freebox_url}")
+    for item, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            item['failed'] = True
+            item['message'] = f"Error configuring static DHCP: {str(outcome)}"
+        else:
+            item['changed'] = True
+            item['message'] = f"Static DHCP configured for MAC {item['mac']} with IP {item['ip']}"
+
+    retry = [item for item in pending if item['failed']]
+    if retry:
+        # The cache may have been stale or another run created the lease meanwhile, check once more
+        try:
+            lease_by_mac = await _get_static_leases(fb, freebox_url)
+        except Exception:
+            lease_by_mac = {}
+        for item in retry:
+            if item['mac'] in lease_by_mac:
+                item['failed'] = False
+                item['message'] = f"Static DHCP lease already exists for MAC {item['mac']}"
+
+    return results
+
+
+async def configure_static_dhcp(freebox_url, mac, ip, session_token, check_mode=False):
+    """
+    Configures the static DHCP mapping for the given MAC address and IP.
+
+    Args:
+        freebox_url (str): The URL of the Freebox device.
+        mac (str): The MAC address to configure.
+        ip (str): The static IP address to assign.
+        session_token (str): The authentication token for the Freebox API.
+        check_mode (bool): Only report whether the lease would be created.
+
+    Returns:
+        bool: True if the static DHCP configuration is successful. False if nothing changed
+
+    Raises:
+        Exception: If the configuration fails.
+    """
+    results = await configure_static_dhcp_leases(freebox_url, [dict(mac=mac, ip=ip)], session_token, check_mode)
+    if results[0]['failed']:
+        raise Exception(results[0]['message'])
+    return results[0]['changed']
+
 
 async def run_module():
     # Define the arguments/parameters that can be passed to the module
     module_args = dict(
         freebox_url=dict(type='str', required=False, default='mafreebox.freebox.fr'),
-        mac=dict(type='str', required=True),
-        ip=dict(type='str', required=True)
+        mac=dict(type='str', required=False),
+        ip=dict(type='str', required=False),
+        leases=dict(
+            type='list',
+            elements='dict',
+            required=False,
+            options=dict(
+                mac=dict(type='str', required=True),
+                ip=dict(type='str', required=True)
+            )
+        )
     )
 
     # Seed the result dictionary
@@ -154,22 +339,43 @@ async def run_module():
     # Instantiate the AnsibleModule object
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[('mac', 'leases'), ('ip', 'leases')],
+        required_together=[('mac', 'ip')],
+        required_one_of=[('mac', 'leases')],
         supports_check_mode=True
     )
 
+    if not has_freebox_api():
+        module.fail_json(msg=missing_required_lib('freebox-api'))
+
     # Extract the parameters
     freebox_url = module.params['freebox_url']
     mac = module.params['mac']
     ip = module.params['ip']
+    leases = module.params['leases']
 
     # Try to configure static DHCP and handle errors
     try:
         # Authenticate and configure static DHCP
         session_token = 'your_session_token'  # Replace with actual authentication token or session
-        result['changed'] = await configure_static_dhcp(freebox_url, mac, ip, session_token)
-        result['message'] = f"Static DHCP configured for MAC {mac} with IP {ip}"
-        result['mac_address'] = mac
-        result['ip_address'] = ip
+        verb = "would be configured" if module.check_mode else "configured"
+        if leases is not None:
+            result['leases'] = await configure_static_dhcp_leases(freebox_url, leases, session_token, module.check_mode)
+            result['changed'] = any(item['changed'] for item in result['leases'])
+            failed = [item for item in result['leases'] if item['failed']]
+            if failed:
+                result['message'] = f"Failed to configure {len(failed)} of {len(result['leases'])} static DHCP leases"
+                module.fail_json(msg=result['message'], **result)
+            changed = [item for item in result['leases'] if item['changed']]
+            result['message'] = f"Static DHCP {verb} for {len(changed)} of {len(result['leases'])} leases"
+        else:
+            result['changed'] = await configure_static_dhcp(freebox_url, mac, ip, session_token, module.check_mode)
+            # Report the normalized addresses, as sent to the Freebox
+            mac = _norm_mac(mac)
+            ip = str(ipaddress.ip_address(ip))
+            result['message'] = f"Static DHCP {verb} for MAC {mac} with IP {ip}"
+            result['mac_address'] = mac
+            result['ip_address'] = ip
 
         # Return the result
         module.exit_json(**result)
@@ -181,7 +387,7 @@ async def run_module():
 
 
 def main():
-    asyncio.run(run_module())
+    get_loop().run_until_complete(run_module())
 
 
 if __name__ == '__main__':
@@ -6,9 +6,15 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
-import json
-from ansible.module_utils.basic import AnsibleModule
-from freebox_api import Freepybox
+from ansible.module_utils.basic import AnsibleModule, missing_required_lib
+from ansible_collections.lpi_code.freebox.plugins.module_utils.freebox import (
+    CACHE_TTL,
+    cached,
+    get_fb,
+    get_loop,
+    has_freebox_api,
+    invalidate_cache,
+)
 import asyncio
 
 DOCUMENTATION = r'''
@@ -22,6 +28,8 @@ version_added: "1.0.0"
 description: |
     This module configures NAT rules (port forwarding, etc.) on a Freebox router.
     It requires the Freebox API to be accessible and valid credentials for authentication.
+    The existing rules are cached for 60 seconds under $XDG_CACHE_HOME/freebox_ansible
+    (~/.cache/freebox_ansible by default) and the cache is dropped whenever a rule is created.
 
 options:
     freebox_url:
@@ -31,28 +39,38 @@ options:
         default: 'mafreebox.freebox.fr'
 
     lan_ip:
-        description: The internal IP address to forward the traffic to.
-        required: true
+        description: |
+            The internal IP address to forward the traffic to.
+            Required unless rules is used.
+        required: false
         type: str
 
     lan_port:
-        description: The internal port to forward the traffic to.
-        required: true
+        description: |
+            The internal port to forward the traffic to.
+            Required unless rules is used.
+        required: false
         type: int
 
     wan_port_start:
-        description: The starting external port to forward.
-        required: true
+        description: |
+            The starting external port to forward.
+            Required unless rules is used.
+        required: false
         type: int
 
     wan_port_end:
-        description: The ending external port to forward.
-        required: true
+        description: |
+            The ending external port to forward.
+            Required unless rules is used.
+        required: false
         type: int
 
     ip_proto:
-        description: The protocol for the NAT rule (either 'tcp' or 'udp').
-        required: true
+        description: |
+            The protocol for the NAT rule (either 'tcp' or 'udp').
+            Required unless rules is used.
+        required: false
         type: str
         choices:
             - tcp
@@ -65,8 +83,10 @@ options:
         default: '0.0.0.0'
 
     enabled:
-        description: Whether the NAT rule is enabled or not (true/false).
-        required: true
+        description: |
+            Whether the NAT rule is enabled or not (true/false).
+            Required unless rules is used.
+        required: false
         type: bool
 
     comment:
@@ -74,6 +94,53 @@ options:
         required: false
         type: str
 
+    rules:
+        description: |
+            A list of NAT rules to configure in a single Freebox session.
+            Existing rules are fetched once and the missing ones are created concurrently.
+            Duplicate rules are configured once, rules forwarding the same ports with different settings fail.
+            Mutually exclusive with the single rule options.
+        required: false
+        type: list
+        elements: dict
+        suboptions:
+            lan_ip:
+                description: The internal IP address to forward the traffic to.
+                required: true
+                type: str
+            lan_port:
+                description: The internal port to forward the traffic to.
+                required: true
+                type: int
+            wan_port_start:
+                description: The starting external port to forward.
+                required: true
+                type: int
+            wan_port_end:
+                description: The ending external port to forward.
+                required: true
+                type: int
+            ip_proto:
+                description: The protocol for the NAT rule (either 'tcp' or 'udp').
+                required: true
+                type: str
+                choices:
+                    - tcp
+                    - udp
+            src_ip:
+                description: The source IP address allowed for the NAT rule.
+                required: false
+                type: str
+                default: '0.0.0.0'
+            enabled:
+                description: Whether the NAT rule is enabled or not (true/false).
+                required: true
+                type: bool
+            comment:
+                description: A comment for the NAT rule.
+                required: false
+                type: str
+
 author:
     - Your Name (@yourGitHubHandle)
 '''
@@ -104,6 +171,25 @@ EXAMPLES = r'''
     src_ip: "0.0.0.0"
     enabled: true
     comment: "Test UDP rule"
+
+# Configure several NAT rules at once
+- name: Set NAT rules on Freebox
+  freebox_nat:
+    rules:
+      - lan_ip: "192.168.1.42"
+        lan_port: 80
+        wan_port_start: 8080
+        wan_port_end: 8080
+        ip_proto: "tcp"
+        enabled: true
+        comment: "Web server"
+      - lan_ip: "192.168.1.42"
+        lan_port: 443
+        wan_port_start: 8443
+        wan_port_end: 8443
+        ip_proto: "tcp"
+        enabled: true
+        comment: "Web server TLS"
 '''
 
 RETURN = r'''
@@ -166,9 +252,152 @@ comment:
     type: str
     returned: always
     sample: 'Test NAT rule'
+
+rules:
+    description: The outcome of each NAT rule when rules is used.
+    type: list
+    elements: dict
+    returned: when rules is used
+    sample: [{"lan_ip": "192.168.1.42", "lan_port": 80, "wan_port_start": 8080, "wan_port_end": 8080, "ip_proto": "tcp", "src_ip": "0.0.0.0", "enabled": true, "comment": "Web server", "changed": true, "failed": false, "message": "NAT rule configured for tcp from external port 8080 to internal 192.168.1.42:80"}]
 '''
 
-async def configure_nat(freebox_url, lan_ip, lan_port, wan_port_start, wan_port_end, ip_proto, src_ip, enabled, comment, session_token):
+async def _get_nat_rules(fb, freebox_url):
+    """
+    Returns the NAT rules configured on the Freebox, reusing the on-disk cache when it is fresh.
+
+    Args:
+        fb (Freepybox): The authenticated Freebox API client.
+        freebox_url (str): The URL of the Freebox device.
+
+    Returns:
+        list: The port forwarding configurations.
+    """
+    return await cached(f"nat_rules-{freebox_url}", CACHE_TTL, fb.fw.get_all_port_forwarding_configuration)
+
+
+def _rule_key(rule):
+    """
+    Returns the fields identifying a NAT rule, used to detect already existing rules.
+    """
+    return (rule['lan_ip'], rule['lan_port'], rule['wan_port_start'], rule['wan_port_end'], rule['ip_proto'].upper())
+
+
+async def _create_nat_rule(fb, rule):
+    """
+    Creates a single NAT rule.
+
+    Args:
+        fb (Freepybox): The authenticated Freebox API client.
+        rule (dict): The NAT rule, with the same keys as the module options.
+
+    Raises:
+        Exception: If the Freebox API rejects the rule.
+    """
+    result = await fb.fw.create_port_forwarding_configuration(
+        {
+            "enabled": rule['enabled'],
+            "comment": rule['comment'],
+            "lan_port": rule['lan_port'],
+            "wan_port_start": rule['wan_port_start'],
+            "wan_port_end": rule['wan_port_end'],
+            "lan_ip": rule['lan_ip'],
+            "ip_proto": rule['ip_proto'],
+            "src_ip": rule['src_ip']
+        }
+    )
+
+    if result.get("enabled") is None:
+        raise Exception(f"Failed to configure NAT rule: {result['msg']}")
+
+
+async def configure_nat_rules(freebox_url, rules, session_token, check_mode=False):
+    """
+    Configures several NAT rules using a single Freebox session.
+
+    The existing rules are fetched once and the missing ones are created concurrently.
+
+    Args:
+        freebox_url (str): The URL of the Freebox device.
+        rules (list): The NAT rules to configure, as dicts with the same keys as the module options.
+        session_token (str): The authentication token for the Freebox API.
+        check_mode (bool): Only report the rules that would be created.
+
+    Returns:
+        list: One dict per distinct rule with the rule fields plus 'changed', 'failed' and 'message' keys.
+
+    Raises:
+        Exception: If the existing rules cannot be retrieved.
+    """
+    try:
+        # Connect to the Freebox API
+        fb = await get_fb(freebox_url)
+
+        # Check which NAT rules already exist
+        nat_rules = await _get_nat_rules(fb, freebox_url)
+        existing_rules = {_rule_key(rule) for rule in nat_rules}
+    except Exception as e:
+        raise Exception(f"Error configuring NAT: {str(e)}")
+
+    # Identical rules, e.g. produced by templating, are configured once
+    rules_by_key = {}
+    for rule in rules:
+        variants = rules_by_key.setdefault(_rule_key(rule), [])
+        if rule not in variants:
+            variants.append(rule)
+
+    results = []
+    pending = []
+    for key, variants in rules_by_key.items():
+        for rule in variants:
+            item = dict(rule, changed=False, failed=False, message='')
+            if len(variants) > 1:
+                # Same forwarding with different settings, don't let the request order decide
+                item['failed'] = True
+                item['message'] = "Conflicting settings given for the same NAT rule"
+            elif key in existing_rules:
+                item['message'] = "NAT rule already exists"
+            else:
+                pending.append(item)
+            results.append(item)
+
+    if check_mode:
+        for item in pending:
+            item['changed'] = True
+            item['message'] = f"NAT rule would be configured for {item['ip_proto']} from external port {item['wan_port_start']} to internal {item['lan_ip']}:{item['lan_port']}"
+        return results
+
+    # Make the requests to configure the NAT rules
+    outcomes = await asyncio.gather(
+        *[_create_nat_rule(fb, item) for item in pending],
+        return_exceptions=True
+    )
+    if pending:
+        # The cached rule table no longer reflects the Freebox
+        invalidate_cache(f"nat_rules-{freebox_url}")
+    for item, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            item['failed'] = True
+            item['message'] = f"Error configuring NAT: {str(outcome)}"
+        else:
+            item['changed'] = True
+            item['message'] = f"NAT rule configured for {item['ip_proto']} from external port {item['wan_port_start']} to internal {item['lan_ip']}:{item['lan_port']}"
+
+    retry = [item for item in pending if item['failed']]
+    if retry:
+        # The cache may have been stale or another run created the rule meanwhile, check once more
+        try:
+            existing_rules = {_rule_key(rule) for rule in await _get_nat_rules(fb, freebox_url)}
+        except Exception:
+            existing_rules = set()
+        for item in retry:
+            if _rule_key(item) in existing_rules:
+                item['failed'] = False
+                item['message'] = "NAT rule already exists"
+
+    return results
+
+
+async def configure_nat(freebox_url, lan_ip, lan_port, wan_port_start, wan_port_end, ip_proto, src_ip, enabled, comment, session_token, check_mode=False):
     """
     Configures the NAT (Network Address Translation) rule on the Freebox router.
 
@@ -183,6 +412,7 @@ async def configure_nat(freebox_url, lan_ip, lan_port, wan_port_start, wan_port_
         enabled (bool): Whether the rule is enabled or disabled.
         comment (str): A comment for the NAT rule.
         session_token (str): The authentication token for the Freebox API.
+        check_mode (bool): Only report whether the rule would be created.
 
     Returns:
         bool: True if the NAT configuration is successful. False if nothing changed.
@@ -190,57 +420,51 @@ async def configure_nat(freebox_url, lan_ip, lan_port, wan_port_start, wan_port_
     Raises:
         Exception: If the configuration fails.
     """
-    try:
-        # Connect to the Freebox API
-        fb = Freepybox()
-        await fb.open(freebox_url, 443)
-
-        # Check if the NAT rule already exists
-        nat_rules = await fb.fw.get_all_port_forwarding_configuration()
-        for rule in nat_rules:
-            if (rule['lan_ip'] == lan_ip and
-                rule['lan_port'] == lan_port and
-                rule['wan_port_start'] == wan_port_start and
-                rule['wan_port_end'] == wan_port_end and
-                rule['ip_proto'].upper() == ip_proto.upper()):
-                return False  # Rule already exists
-
-        # Make the request to configure the NAT rule
-        result = await fb.fw.create_port_forwarding_configuration(
-            {
-                "enabled": enabled,
-                "comment": comment,
-                "lan_port": lan_port,
-                "wan_port_start": wan_port_start,
-                "wan_port_end": wan_port_end,
-                "lan_ip": lan_ip,
-                "ip_proto": ip_proto,
-                "src_ip": src_ip
-            }
-        )
-
-        if result.get("enabled") is not None:
-            return True
-        else:
-            raise Exception(f"Failed to configure NAT rule: {result['msg']}")
-    
-    except Exception as e:
-        raise Exception(f"Error configuring NAT: {str(e)}")
+    rule = dict(
+        lan_ip=lan_ip,
+        lan_port=lan_port,
+        wan_port_start=wan_port_start,
+        wan_port_end=wan_port_end,
+        ip_proto=ip_proto,
+        src_ip=src_ip,
+        enabled=enabled,
+        comment=comment
+    )
+    results = await configure_nat_rules(freebox_url, [rule], session_token, check_mode)
+    if results[0]['failed']:
+        raise Exception(results[0]['message'])
+    return results[0]['changed']
 
 
 async def run_module():
     # Define the arguments/parameters that can be passed to the module
     module_args = dict(
         freebox_url=dict(type='str', required=False, default='mafreebox.freebox.fr'),
-        lan_ip=dict(type='str', required=True),
-        lan_port=dict(type='int', required=True),
-        wan_port_start=dict(type='int', required=True),
-        wan_port_end=dict(type='int', required=True),
-        ip_proto=dict(type='str', required=True, choices=['tcp', 'udp']),
+        lan_ip=dict(type='str', required=False),
+        lan_port=dict(type='int', required=False),
+        wan_port_start=dict(type='int', required=False),
+        wan_port_end=dict(type='int', required=False),
+        ip_proto=dict(type='str', required=False, choices=['tcp', 'udp']),
         src_ip=dict(type='str', required=False, default='0.0.0.0'),
-        enabled=dict(type='bool', required=True),
-        comment=dict(type='str', required=False, default="")
+        enabled=dict(type='bool', required=False),
+        comment=dict(type='str', required=False, default=""),
+        rules=dict(
+            type='list',
+            elements='dict',
+            required=False,
+            options=dict(
+                lan_ip=dict(type='str', required=True),
+                lan_port=dict(type='int', required=True),
+                wan_port_start=dict(type='int', required=True),
+                wan_port_end=dict(type='int', required=True),
+                ip_proto=dict(type='str', required=True, choices=['tcp', 'udp']),
+                src_ip=dict(type='str', required=False, default='0.0.0.0'),
+                enabled=dict(type='bool', required=True),
+                comment=dict(type='str', required=False, default="")
+            )
+        )
     )
+    rule_params = ('lan_ip', 'lan_port', 'wan_port_start', 'wan_port_end', 'ip_proto', 'enabled')
 
     # Seed the result dictionary
     result = dict(
@@ -260,9 +484,15 @@ async def run_module():
     # Instantiate the AnsibleModule object
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[(param, 'rules') for param in rule_params],
+        required_together=[rule_params],
+        required_one_of=[('lan_ip', 'rules')],
         supports_check_mode=True
     )
 
+    if not has_freebox_api():
+        module.fail_json(msg=missing_required_lib('freebox-api'))
+
     # Extract the parameters
     freebox_url = module.params['freebox_url']
     lan_ip = module.params['lan_ip']
@@ -273,21 +503,33 @@ async def run_module():
     src_ip = module.params['src_ip']
     enabled = module.params['enabled']
     comment = module.params['comment']
+    rules = module.params['rules']
 
     # Try to configure the NAT rule and handle errors
     try:
         # Authenticate and configure NAT rule
         session_token = 'your_session_token'  # Replace with actual authentication token or session
-        result['changed'] = await configure_nat(freebox_url, lan_ip, lan_port, wan_port_start, wan_port_end, ip_proto, src_ip, enabled, comment, session_token)
-        result['message'] = f"NAT rule configured for {ip_proto} from external port {wan_port_start} to internal {lan_ip}:{lan_port}"
-        result['lan_ip'] = lan_ip
-        result['lan_port'] = lan_port
-        result['wan_port_start'] = wan_port_start
-        result['wan_port_end'] = wan_port_end
-        result['ip_proto'] = ip_proto
-        result['src_ip'] = src_ip
-        result['enabled'] = enabled
-        result['comment'] = comment
+        verb = "would be configured" if module.check_mode else "configured"
+        if rules is not None:
+            result['rules'] = await configure_nat_rules(freebox_url, rules, session_token, module.check_mode)
+            result['changed'] = any(item['changed'] for item in result['rules'])
+            failed = [item for item in result['rules'] if item['failed']]
+            if failed:
+                result['message'] = f"Failed to configure {len(failed)} of {len(result['rules'])} NAT rules"
+                module.fail_json(msg=result['message'], **result)
+            changed = [item for item in result['rules'] if item['changed']]
+            result['message'] = f"NAT {verb} for {len(changed)} of {len(result['rules'])} rules"
+        else:
+            result['changed'] = await configure_nat(freebox_url, lan_ip, lan_port, wan_port_start, wan_port_end, ip_proto, src_ip, enabled, comment, session_token, module.check_mode)
+            result['message'] = f"NAT rule {verb} for {ip_proto} from external port {wan_port_start} to internal {lan_ip}:{lan_port}"
+            result['lan_ip'] = lan_ip
+            result['lan_port'] = lan_port
+            result['wan_port_start'] = wan_port_start
+            result['wan_port_end'] = wan_port_end
+            result['ip_proto'] = ip_proto
+            result['src_ip'] = src_ip
+            result['enabled'] = enabled
+            result['comment'] = comment
 
         # Return the result
         module.exit_json(**result)
@@ -299,7 +541,7 @@ async def run_module():
 
 
 def main():
-    asyncio.run(run_module())
+    get_loop().run_until_complete(run_module())
 
 
 if __name__ == '__main__':